@@ -0,0 +1,258 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+SYSTEM_PROMPT = (
+    "You explain anomalies detected in smart-city time-series data "
+    "(urban traffic and passenger flow)."
+)
+
+
+def summarize_by_column(outliers: pd.DataFrame) -> Dict[str, dict]:
+    """
+    Build one summary per numeric column of the outlier rows,
+    e.g. {"Speed_kmh": {"count": 3.0, "mean": 97.3, ...}, ...}.
+    """
+    numeric = outliers.select_dtypes(include=[np.number])
+    return {str(col): numeric[col].describe().to_dict() for col in numeric.columns}
+
+
+def summarize_by_window(outliers: pd.DataFrame, freq: str = "1h") -> Dict[str, dict]:
+    """
+    Build one summary per time window of the outlier rows (requires a
+    DatetimeIndex). Windows without outliers are skipped.
+    """
+    numeric = outliers.select_dtypes(include=[np.number])
+    summaries = {}
+    for window, chunk in numeric.groupby(numeric.index.floor(freq)):
+        if not chunk.empty:
+            summaries[window.isoformat()] = chunk.describe().to_dict()
+    return summaries
+
+
+def summary_key(summary: dict, model: str = DEFAULT_MODEL, label: Optional[str] = None) -> str:
+    """
+    Stable SHA-256 hash of an anomaly summary, its label (column or window)
+    and the model answering it. The same stats under another label are
+    another question.
+    """
+    question = {"model": model, "summary": summary}
+    if label is not None:
+        question["label"] = label
+    payload = json.dumps(question, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Bounded in-memory LRU of explanations keyed by `summary_key`, optionally
+    backed by a directory of `<key>.json` files so answers survive restarts.
+    """
+
+    def __init__(self, maxsize: int = 256, cache_dir: Optional[str] = None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), encoding="utf-8") as fh:
+                    text = json.load(fh)["explanation"]
+            except (OSError, ValueError, KeyError):
+                return None
+            self._remember(key, text)
+            return text
+        return None
+
+    def set(self, key: str, text: str) -> None:
+        self._remember(key, text)
+        if self.cache_dir:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({"explanation": text}, fh)
+            os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key: str, text: str) -> None:
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AnomalyExplainer:
+    """
+    Ask an OpenAI-compatible chat model to explain outlier summaries.
+
+    - Answers are cached by a hash of the label and summary, so repeat questions cost nothing.
+    - Identical questions already in flight share a single model call.
+    - `explain_batch` sends uncached summaries together, `max_batch_size` per request,
+      with `max_tokens` budgeted per summary.
+    - At most `max_concurrency` requests run at once.
+
+    Pass `base_url` to point the client at a local stub server (no API key needed).
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = DEFAULT_MODEL,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 4,
+        cache: Optional[ExplanationCache] = None,
+        max_tokens: int = 512,
+        temperature: float = 0.4,
+        max_batch_size: int = 8,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_batch_size = max_batch_size
+        self.cache = cache if cache is not None else ExplanationCache()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._client = None
+
+    @property
+    def client(self):
+        # Created lazily so the module imports without an API key configured.
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            # A local stub server takes any key, so don't require one there
+            api_key = self.api_key or ("unused" if self.base_url else None)
+            self._client = AsyncOpenAI(api_key=api_key, base_url=self.base_url)
+        return self._client
+
+    async def _complete(self, prompt: str, max_tokens: int, json_mode: bool = False) -> str:
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        async with self._semaphore:
+            resp = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=max_tokens,
+                temperature=self.temperature,
+                **kwargs,
+            )
+        return (resp.choices[0].message.content or "").strip()
+
+    async def explain(self, summary: dict) -> str:
+        """
+        Explain a single outlier summary (e.g. `outliers.describe().to_dict()`).
+        """
+        # Unlabelled (None): asked about "the anomalies" as a whole
+        return (await self.explain_batch({None: summary}))[None]
+
+    async def explain_batch(self, summaries: Dict[str, dict]) -> Dict[str, str]:
+        """
+        Explain several labelled summaries (columns or time windows) at once.
+        Cached labels are answered locally, labels already being asked elsewhere
+        wait for that call, and the remaining labels go out in requests of up
+        to `max_batch_size` labels each. Returns {label: explanation}.
+        """
+        keys = {
+            label: summary_key(summary, self.model, label)
+            for label, summary in summaries.items()
+        }
+        results: Dict[str, str] = {}
+        new: Dict[str, str] = {}  # key -> first label asking for it
+
+        for label, key in keys.items():
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[label] = cached
+            elif key not in self._in_flight and key not in new:
+                new[key] = label
+
+        items = list(new.items())
+        for i in range(0, len(items), self.max_batch_size):
+            chunk = dict(items[i:i + self.max_batch_size])
+            # Own task, so a cancelled caller doesn't cancel the call others share
+            task = asyncio.ensure_future(
+                self._ask_and_cache({label: summaries[label] for label in chunk.values()}, chunk)
+            )
+            for key in chunk:
+                self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._finish, list(chunk)))
+
+        tasks = {label: self._in_flight[key] for label, key in keys.items() if label not in results}
+        for label, task in tasks.items():
+            results[label] = (await asyncio.shield(task))[keys[label]]
+
+        return {label: results[label] for label in summaries}
+
+    async def _ask_and_cache(self, summaries: Dict[str, dict], labels: Dict[str, str]) -> Dict[str, str]:
+        # Returns {key: explanation}; `labels` maps key -> label used in the prompt
+        answers = await self._ask(summaries)
+        texts = {key: answers[label] for key, label in labels.items()}
+        for key, text in texts.items():
+            self.cache.set(key, text)
+        return texts
+
+    def _finish(self, keys: List[str], task: asyncio.Future) -> None:
+        for key in keys:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+        if not task.cancelled():
+            # Mark retrieved so a failure nobody awaited isn't logged as unhandled.
+            task.exception()
+
+    async def _ask(self, summaries: Dict[str, dict]) -> Dict[str, str]:
+        if len(summaries) == 1:
+            (label, summary), = summaries.items()
+            subject = "in a time-series" if label is None else f"for {label} in a time-series"
+            prompt = (
+                f"Detected these outlier summary stats {subject}:\n"
+                f"{json.dumps(summary, default=str)}\n"
+                "Explain potential causes in an urban traffic/passenger-flow context."
+            )
+            return {label: await self._complete(prompt, self.max_tokens)}
+
+        blocks = "\n".join(
+            f"- {label}: {json.dumps(summary, default=str)}"
+            for label, summary in summaries.items()
+        )
+        prompt = (
+            "Detected these outlier summary stats in a time-series, one per label:\n"
+            f"{blocks}\n"
+            "For each label, explain potential causes in an urban "
+            "traffic/passenger-flow context. Reply with a JSON object mapping "
+            "each label to its explanation string."
+        )
+        text = await self._complete(
+            prompt, self.max_tokens * len(summaries), json_mode=True
+        )
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, dict) or not all(
+            isinstance(parsed.get(label), str) for label in summaries
+        ):
+            raise ValueError(f"Expected a JSON object keyed by label, got: {text[:200]}")
+        return {label: parsed[label].strip() for label in summaries}
@@ -0,0 +1,358 @@
+import base64
+import binascii
+import json
+import operator
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from flowmatic.time_index import Positions, TimeIndex, to_timestamp
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoding
+    orjson = None
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+# Match sets up to this size are sorted directly; larger ones use a SortCache
+DIRECT_SORT_MAX_ROWS = 100_000
+
+FILTER_OPS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+}
+
+
+def encode_cursor(offset: int) -> str:
+    """
+    Opaque pagination cursor for the row at `offset` of a query result.
+    """
+    raw = json.dumps({"offset": offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["offset"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return offset
+
+
+def _coerce(series: pd.Series, value: str):
+    # Compare filter values in the column's own type
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return value.lower() in ("1", "true", "yes")
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return float(value)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.Timestamp(value)
+    return value
+
+
+def parse_filter(spec: str) -> Tuple[str, str, str]:
+    """
+    Parse a `column:op:value` filter, e.g. "Speed_kmh:gt:50".
+    """
+    parts = spec.split(":", 2)
+    if len(parts) != 3 or parts[1] not in FILTER_OPS:
+        raise ValueError(
+            f"Invalid filter {spec!r}; expected column:op:value with op in {sorted(FILTER_OPS)}"
+        )
+    return parts[0], parts[1], parts[2]
+
+
+def time_positions(index: pd.Index, start: Optional[str], end: Optional[str]) -> Positions:
+    """
+    Row positions with start <= timestamp < end: a slice when the index is
+    sorted (binary search) or no range is given, a mask-derived array otherwise.
+    Naive bounds on a timezone-aware index are taken to be in its timezone.
+    """
+    n = len(index)
+    if start is None and end is None:
+        return slice(0, n)
+    tz = getattr(index, "tz", None)
+    lo_ts = to_timestamp(start, tz) if start is not None else None
+    hi_ts = to_timestamp(end, tz) if end is not None else None
+    if index.is_monotonic_increasing:
+        lo = int(index.searchsorted(lo_ts, side="left")) if lo_ts is not None else 0
+        hi = int(index.searchsorted(hi_ts, side="left")) if hi_ts is not None else n
+        return slice(lo, max(lo, hi))
+    mask = np.ones(n, dtype=bool)
+    if lo_ts is not None:
+        mask &= index >= lo_ts
+    if hi_ts is not None:
+        mask &= index < hi_ts
+    return np.flatnonzero(mask)
+
+
+def _count(positions: Positions) -> int:
+    if isinstance(positions, slice):
+        return positions.stop - positions.start
+    return len(positions)
+
+
+def _take(positions: Positions, lo: int, hi: int) -> Positions:
+    # Entries [lo, hi) of a position set, without expanding a slice
+    if isinstance(positions, slice):
+        start = min(positions.start + lo, positions.stop)
+        return slice(start, min(positions.start + hi, positions.stop))
+    return positions[lo:hi]
+
+
+def _sort_values(df: pd.DataFrame, key: str) -> np.ndarray:
+    return df.index.to_numpy() if key == "index" else df[key].to_numpy()
+
+
+def _argsort(values: np.ndarray, descending: bool) -> np.ndarray:
+    return pd.Series(values).sort_values(
+        ascending=not descending, kind="stable", na_position="last"
+    ).index.to_numpy()
+
+
+def _reverse_order(order: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Turn the stable ascending permutation `order` of `values` into the stable
+    descending one without sorting again: reverse the non-missing prefix, then
+    restore the original order within each run of equal values. Missing
+    values stay last.
+    """
+    present = len(order) - int(pd.isna(values).sum())
+    reversed_ = order[:present][::-1]
+    if present > 1:
+        ordered = values[reversed_]
+        run_start = np.ones(present, dtype=bool)
+        run_start[1:] = ordered[1:] != ordered[:-1]
+        starts = np.flatnonzero(run_start)
+        runs = np.cumsum(run_start) - 1
+        ends = np.append(starts[1:], present)
+        # Position i of a run [s, e) takes the entry at s + e - 1 - i
+        reversed_ = reversed_[starts[runs] + ends[runs] - 1 - np.arange(present)]
+    return np.concatenate([reversed_, order[present:]])
+
+
+class SortCache:
+    """
+    Ascending sort permutations of a stored DataFrame, one per column.
+    Each is computed by the first request sorting on it and reused after, so
+    later sorted pages don't re-sort the matching rows; descending orders are
+    derived from it in linear time instead of being sorted or stored. At most
+    `maxsize` permutations (n int64s each) are kept, least recently used
+    first out. Safe to share between threads.
+    """
+
+    def __init__(self, df: pd.DataFrame, maxsize: int = 8):
+        self.df = df
+        self.maxsize = maxsize
+        self._orders: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ascending(self, key: str, values: np.ndarray) -> np.ndarray:
+        with self._lock:
+            order = self._orders.get(key)
+            if order is not None:
+                self._orders.move_to_end(key)
+                return order
+        # Sort outside the lock; a concurrent first sort of `key` just repeats it
+        order = _argsort(values, descending=False)
+        with self._lock:
+            self._orders[key] = order
+            while len(self._orders) > self.maxsize:
+                self._orders.popitem(last=False)
+        return order
+
+    def order(self, key: str, descending: bool = False) -> np.ndarray:
+        values = _sort_values(self.df, key)
+        order = self._ascending(key, values)
+        return _reverse_order(order, values) if descending else order
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+
+def _scan_order(order: np.ndarray, positions: Positions, n: int, need: int) -> np.ndarray:
+    """
+    First `need` entries of the cached permutation `order` that belong to
+    `positions`, scanning only as far as needed.
+    """
+    if isinstance(positions, slice):
+        if positions.start == 0 and positions.stop == n:
+            return order[:need]
+        lo, hi = positions.start, positions.stop
+        member = lambda chunk: (chunk >= lo) & (chunk < hi)
+    else:
+        mask = np.zeros(n, dtype=bool)
+        mask[positions] = True
+        member = lambda chunk: mask[chunk]
+
+    hits, found, i = [], 0, 0
+    step = max(4 * need, 65536)
+    while found < need and i < len(order):
+        chunk = order[i:i + step]
+        chunk = chunk[member(chunk)]
+        hits.append(chunk)
+        found += len(chunk)
+        i += step
+        step *= 2
+    return np.concatenate(hits)[:need] if hits else np.empty(0, dtype=np.int64)
+
+
+def query_results(
+    df: pd.DataFrame,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    sort: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+    entity: Optional[str] = None,
+    index: Optional[TimeIndex] = None,
+    sorter: Optional[SortCache] = None,
+) -> Tuple[pd.DataFrame, int, Optional[int]]:
+    """
+    Select one page of `df`:
+    - `start`/`end`: time range on the DatetimeIndex (start inclusive, end exclusive).
+    - `entity`: only rows of this entity (requires an `index` with an entity column).
+    - `columns`: projection; defaults to every column.
+    - `sort`: column name, "-column" for descending; "index" sorts by time.
+    - `filters`: list of "column:op:value" predicates, AND-ed together.
+
+    Time ranges are binary searched (via `index` when given) and kept as
+    slices, so unfiltered, unsorted pages are `iloc` slices of `df`. Filters
+    scan only the rows in range, skipping blocks ruled out by the index's zone
+    maps. Sorting a large match set walks a permutation cached in `sorter`
+    instead of re-sorting it. Returns (page, total matching rows, next offset or None).
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if offset < 0:
+        raise ValueError("offset must be >= 0")
+
+    columns = list(columns) if columns else list(df.columns)
+    unknown = [c for c in columns if c not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+
+    if index is not None:
+        positions = index.positions(start, end, entity)
+    elif entity is not None:
+        raise ValueError("entity lookups require an index with an entity column")
+    else:
+        positions = time_positions(df.index, start, end)
+
+    for spec in filters or []:
+        col, op, raw = parse_filter(spec)
+        if col not in df.columns:
+            raise ValueError(f"Unknown filter column: {col!r}")
+        series = df[col]
+        if index is not None and pd.api.types.is_numeric_dtype(series.dtype):
+            try:
+                positions = index.prune(positions, col, op, float(raw))
+            except ValueError:
+                pass  # not a number; the full comparison below reports it
+        # Series comparisons treat missing values (NaN in string columns) as
+        # non-matching instead of raising, as raw object arrays do
+        try:
+            matched = FILTER_OPS[op](series.iloc[positions], _coerce(series, raw))
+            keep = matched.fillna(False).to_numpy(dtype=bool)
+        except (TypeError, ValueError):
+            raise ValueError(f"Cannot apply filter {spec!r} to column of type {series.dtype}")
+        if isinstance(positions, slice):
+            positions = np.flatnonzero(keep) + positions.start
+        else:
+            positions = positions[keep]
+
+    total = _count(positions)
+    if sort:
+        descending = sort.startswith("-")
+        key = sort.lstrip("-")
+        if key != "index" and key not in df.columns:
+            raise ValueError(f"Unknown sort column: {key!r}")
+        if sorter is not None and total > DIRECT_SORT_MAX_ROWS:
+            need = offset + limit
+            page_positions = _scan_order(sorter.order(key, descending), positions, len(df), need)[offset:]
+        else:
+            values = _sort_values(df, key)[positions]
+            order = _argsort(values, descending)[offset:offset + limit]
+            if isinstance(positions, slice):
+                page_positions = order + positions.start
+            else:
+                page_positions = positions[order]
+    else:
+        page_positions = _take(positions, offset, offset + limit)
+
+    page = df.iloc[page_positions][columns]
+    next_offset = offset + limit if offset + limit < total else None
+    return page, total, next_offset
+
+
+def _column_values(series: pd.Series):
+    """
+    Values of one column for `dumps`: plain numeric/bool numpy arrays are
+    passed through (orjson encodes them natively, NaN as null); datetimes
+    and timedeltas become ISO 8601 strings; anything else becomes a list
+    with None for missing values.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+        return np.ascontiguousarray(series.to_numpy())
+    if pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype):
+        return [value.isoformat() if pd.notna(value) else None for value in series]
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def to_columnar(page: pd.DataFrame) -> Dict[str, object]:
+    """
+    Column-oriented payload: {"index": [...iso timestamps], "data": {col: [...]}},
+    ready for `dumps`. Missing values become null.
+    """
+    return {
+        "index": _column_values(page.index.to_series()),
+        "data": {str(col): _column_values(page[col]) for col in page.columns},
+    }
+
+
+def _to_builtin(value):
+    # Fallback for values neither encoder handles natively: numpy arrays
+    # (stdlib json) and any other scalar left in an object column (as str)
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "f":
+            return [None if not np.isfinite(v) else v for v in value.tolist()]
+        return value.tolist()
+    return str(value)
+
+
+def dumps(payload: dict) -> bytes:
+    """
+    Encode `payload` as JSON, using orjson (with native numpy support) when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(",", ":"), default=_to_builtin).encode("utf-8")
+
+
+def to_arrow(page: pd.DataFrame) -> bytes:
+    """
+    Serialize `page` as an Arrow IPC stream (requires pyarrow).
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Arrow output requires the 'pyarrow' package")
+
+    table = pa.Table.from_pandas(page, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
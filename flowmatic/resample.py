@@ -0,0 +1,202 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_STATS = ["count", "min", "max", "mean"]
+DEFAULT_LEVELS = ("1min", "15min", "1h", "1D")
+
+
+def _require_datetime_index(df: pd.DataFrame) -> pd.DatetimeIndex:
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise TypeError("resampling requires a DatetimeIndex")
+    return df.index
+
+
+def parse_frequency(freq) -> pd.Timedelta:
+    """
+    Validate a fixed, positive bucket width such as "15min" or "1h".
+    """
+    try:
+        width = pd.Timedelta(freq)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid frequency {freq!r}; expected a fixed width like '15min'")
+    if pd.isna(width) or width <= pd.Timedelta(0):
+        raise ValueError(f"Frequency must be positive, got {freq!r}")
+    return width
+
+
+def _occupied(buckets: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    # Only buckets that received events: size follows row count, not time span
+    return buckets.dropna().unique().sort_values()
+
+
+def _category_counts(others: pd.DataFrame, buckets: pd.DatetimeIndex) -> Dict[str, pd.Series]:
+    """
+    Per-column value counts per bucket: {col: Series indexed by (bucket, value)}.
+    """
+    counts = {}
+    for col in others.columns:
+        series = others[col]
+        counts[col] = series.groupby([buckets, series.to_numpy()]).size()
+    return counts
+
+
+def _modes(counts: Dict[str, pd.Series], occupied: pd.DatetimeIndex) -> pd.DataFrame:
+    modes = {}
+    for col, per_bucket in counts.items():
+        if per_bucket.empty:
+            modes[col] = pd.Series(np.nan, index=occupied, dtype=object)
+            continue
+        winners = per_bucket.groupby(level=0).idxmax()
+        modes[col] = pd.Series(
+            [value for _, value in winners], index=winners.index
+        ).reindex(occupied)
+    return pd.DataFrame(modes, index=occupied)
+
+
+def _flatten(stats: pd.DataFrame, modes: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    """
+    Produce `<col>_<stat>` numeric columns and `<col>_mode` categorical columns,
+    in the original column order.
+    """
+    parts = {}
+    numeric_cols = set(stats.columns.get_level_values(0))
+    for col in columns:
+        if col in numeric_cols:
+            for stat in NUMERIC_STATS:
+                parts[f"{col}_{stat}"] = stats[(col, stat)]
+        elif col in modes.columns:
+            parts[f"{col}_mode"] = modes[col]
+    out = pd.DataFrame(parts, index=stats.index if len(stats.columns) else modes.index)
+    for col in out.columns:
+        if col.endswith("_count"):
+            out[col] = out[col].astype("int64")
+    return out
+
+
+def _aggregate_raw(df: pd.DataFrame, freq: pd.Timedelta) -> Tuple[pd.DataFrame, Dict[str, pd.Series]]:
+    """
+    One vectorized pass over raw rows: numeric count/min/max/mean per bucket
+    (columns are a (col, stat) MultiIndex) plus categorical value counts.
+    """
+    index = _require_datetime_index(df)
+    buckets = index.floor(freq)
+    occupied = _occupied(buckets)
+
+    numeric = df.select_dtypes(include=[np.number])
+    others = df.drop(columns=numeric.columns)
+
+    if numeric.columns.empty:
+        stats = pd.DataFrame(
+            index=occupied, columns=pd.MultiIndex.from_tuples([], names=[None, None])
+        )
+    else:
+        stats = numeric.groupby(buckets).agg(NUMERIC_STATS).reindex(occupied)
+    count_cols = [c for c in stats.columns if c[1] == "count"]
+    stats[count_cols] = stats[count_cols].fillna(0)
+    stats.index.name = index.name
+    return stats, _category_counts(others, buckets)
+
+
+def _aggregate_rollup(
+    stats: pd.DataFrame, counts: Dict[str, pd.Series], freq: pd.Timedelta
+) -> Tuple[pd.DataFrame, Dict[str, pd.Series]]:
+    """
+    Combine an already aggregated level into coarser buckets without touching
+    raw rows: counts add up, min/max of mins/maxes, count-weighted means.
+    """
+    buckets = stats.index.floor(freq)
+    occupied = _occupied(buckets)
+
+    if len(stats.columns):
+        count = stats.xs("count", axis=1, level=1)
+        total = count.groupby(buckets).sum()
+        weighted = (stats.xs("mean", axis=1, level=1) * count).fillna(0)
+        coarse = pd.concat(
+            {
+                "count": total,
+                "min": stats.xs("min", axis=1, level=1).groupby(buckets).min(),
+                "max": stats.xs("max", axis=1, level=1).groupby(buckets).max(),
+                "mean": weighted.groupby(buckets).sum() / total.replace(0, np.nan),
+            },
+            axis=1,
+        ).swaplevel(axis=1).reindex(occupied)
+    else:
+        coarse = pd.DataFrame(index=occupied, columns=stats.columns)
+    coarse.index.name = stats.index.name
+
+    coarse_counts = {}
+    for col, per_bucket in counts.items():
+        bucket_level = per_bucket.index.get_level_values(0).floor(freq)
+        value_level = per_bucket.index.get_level_values(1)
+        coarse_counts[col] = per_bucket.groupby([bucket_level, value_level]).sum()
+    return coarse, coarse_counts
+
+
+def resample(df: pd.DataFrame, freq: str = "1min") -> pd.DataFrame:
+    """
+    Aggregate `df` to regular `freq` buckets in a single vectorized pass.
+    Numeric columns become `<col>_count`, `<col>_min`, `<col>_max`, `<col>_mean`;
+    other columns become `<col>_mode` (most frequent value per bucket).
+    Only buckets containing events are returned.
+    """
+    stats, counts = _aggregate_raw(df, parse_frequency(freq))
+    return _flatten(stats, _modes(counts, stats.index), df.columns)
+
+
+class RollupPyramid:
+    """
+    Precomputed multi-resolution rollups of a DataFrame (default 1min/15min/1h/1D).
+
+    Raw rows are scanned once, for the finest level; every coarser level is
+    combined from the level below it. Levels only hold buckets that contain
+    events. `get(freq)` serves a cached level, or combines one on the fly for
+    any other multiple of the finest level (e.g. "2h") without rescanning the
+    raw data; such ad-hoc resolutions are not kept.
+    """
+
+    def __init__(self, df: pd.DataFrame, levels: Iterable[str] = DEFAULT_LEVELS):
+        self.columns = list(df.columns)
+        widths = {parse_frequency(level): level for level in levels}
+        if not widths:
+            raise ValueError("at least one rollup level is required")
+        ordered = sorted(widths)
+
+        self._names: Dict[pd.Timedelta, str] = {w: widths[w] for w in ordered}
+        self._levels: Dict[pd.Timedelta, Tuple[pd.DataFrame, Dict[str, pd.Series]]] = {}
+        self._views: Dict[pd.Timedelta, pd.DataFrame] = {}
+        self._levels[ordered[0]] = _aggregate_raw(df, ordered[0])
+        for finer, coarser in zip(ordered, ordered[1:]):
+            if coarser % finer != pd.Timedelta(0):
+                raise ValueError(f"level {widths[coarser]!r} is not a multiple of {widths[finer]!r}")
+            self._levels[coarser] = _aggregate_rollup(*self._levels[finer], coarser)
+
+    @property
+    def levels(self) -> list:
+        return list(self._names.values())
+
+    def _source_level(self, width: pd.Timedelta) -> Optional[pd.Timedelta]:
+        # Coarsest cached level that evenly divides `width`
+        divisors = [level for level in self._levels if width % level == pd.Timedelta(0)]
+        return max(divisors, default=None)
+
+    def _flatten_level(self, level: Tuple[pd.DataFrame, Dict[str, pd.Series]]) -> pd.DataFrame:
+        stats, counts = level
+        return _flatten(stats, _modes(counts, stats.index), self.columns)
+
+    def get(self, freq: str) -> pd.DataFrame:
+        """
+        Return the rollup at `freq` in the same layout as `resample`.
+        `freq` must be a positive multiple of the finest level.
+        """
+        width = parse_frequency(freq)
+        if width in self._levels:
+            if width not in self._views:
+                self._views[width] = self._flatten_level(self._levels[width])
+            return self._views[width]
+
+        source = self._source_level(width)
+        if source is None:
+            raise ValueError(f"{freq!r} is not a multiple of the finest level {self.levels[0]!r}")
+        return self._flatten_level(_aggregate_rollup(*self._levels[source], width))
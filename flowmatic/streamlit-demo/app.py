@@ -1,4 +1,5 @@
 import os
+import asyncio
 import pandas as pd
 import streamlit as st
 import openai
@@ -8,6 +9,7 @@ from flowmatic.quality_check import quality_report, detect_outliers_zscore
 from flowmatic.cleaning import clean
 from flowmatic.hf_push import push_df_to_hf
 from flowmatic.db_upload import build_postgres_url, upload_df_to_postgres
+from flowmatic.explain import AnomalyExplainer, ExplanationCache
 
 # —————————————————————————————————————————————————————————
 # Page config
@@ -25,6 +27,12 @@ except Exception:
 if openai_key:
     openai.api_key = openai_key
 
+
+@st.cache_resource
+def get_explanation_cache() -> ExplanationCache:
+    # One cache per server process so reruns don't re-ask the same question
+    return ExplanationCache(cache_dir=os.getenv("FLOWMATIC_EXPLAIN_CACHE_DIR") or None)
+
 # —————————————————————————————————————————————————————————
 # Sidebar: Data Ingestion
 # —————————————————————————————————————————————————————————
@@ -82,20 +90,14 @@ if "df" in st.session_state:
         st.subheader("Explain Anomalies (OpenAI)")
         if not outliers.empty:
             summary = outliers.describe().to_dict()
-            prompt = (
-                "Detected these outlier summary stats in a time-series:\n"
-                f"{summary}\n"
-                "Explain potential causes in an urban traffic/passenger-flow context."
-            )
             if st.button("Ask OpenAI to Explain"):
                 with st.spinner("🔍 Generating explanation…"):
-                    resp = openai.Completion.create(
-                        model="text-davinci-003",
-                        prompt=prompt,
-                        max_tokens=256,
-                        temperature=0.4,
+                    # Each rerun runs its own event loop, so build a fresh explainer
+                    explainer = AnomalyExplainer(
+                        api_key=openai_key, cache=get_explanation_cache()
                     )
-                st.write(resp.choices[0].text.strip())
+                    explanation = asyncio.run(explainer.explain(summary))
+                st.write(explanation)
         else:
             st.info("No outliers to explain.")
     else:
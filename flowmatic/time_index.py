@@ -0,0 +1,202 @@
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BLOCK_SIZE = 65536
+
+Positions = Union[slice, np.ndarray]
+
+
+def to_timestamp(value, tz) -> pd.Timestamp:
+    """
+    Parse a range bound so it compares with an index in timezone `tz`:
+    naive bounds are taken to be in `tz`, aware bounds on a naive index are
+    converted to naive UTC.
+    """
+    ts = pd.Timestamp(value)
+    if tz is not None and ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    if tz is None and ts.tzinfo is not None:
+        return ts.tz_convert(None)
+    return ts
+
+
+def _to_int(value, tz, unit: str) -> int:
+    """
+    Convert a timestamp-like value to an int64 count of `unit`s, comparable
+    with the `asi8` values of an index in timezone `tz` and resolution `unit`
+    (see `to_timestamp`). Rounds up, so that `t >= bound` keeps the same
+    meaning for bounds finer than the index resolution.
+    """
+    ts = to_timestamp(value, tz).ceil(pd.Timedelta(1, unit=unit)).as_unit(unit)
+    return int(ts.asm8.view("i8"))
+
+
+class TimeIndex:
+    """
+    Query index over a stored DataFrame with a DatetimeIndex, built once.
+
+    The frame is physically reordered (one copy, at build time) so that lookups
+    are contiguous row ranges and come back as `iloc` slices (views):
+    - without `entity_col`: rows sorted by time;
+    - with `entity_col`: rows sorted by (entity, time), with per-entity offsets.
+
+    Alongside it keeps the sorted int64 timestamps (in the index's own unit),
+    for O(log n) binary search,
+    and per-block min/max zone maps of numeric columns so filters can skip
+    blocks that cannot match. Use `df` (the reordered frame) with the index.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        entity_col: Optional[str] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ):
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise TypeError("TimeIndex requires a DatetimeIndex")
+        if entity_col is not None and entity_col not in df.columns:
+            raise KeyError(f"Entity column {entity_col!r} not found")
+
+        self.entity_col = entity_col
+        self.block_size = block_size
+        self.tz = df.index.tz
+        # Work in the index's own resolution: forcing "ns" overflows outside 1677-2262
+        self.unit = df.index.unit
+
+        ts = df.index.asi8
+        if entity_col is not None:
+            codes, uniques = pd.factorize(df[entity_col], sort=True)
+            order = np.lexsort((ts, codes))
+        else:
+            order = np.argsort(ts, kind="stable")
+
+        if not np.array_equal(order, np.arange(len(order))):
+            df = df.iloc[order]
+        self.df = df
+        self._ts = ts[order]
+
+        self._entity_offsets: Dict[object, Tuple[int, int]] = {}
+        self._entity_lookup: Dict[str, object] = {}
+        if entity_col is not None:
+            sorted_codes = codes[order]
+            # Code -1 (missing entity) sorts first and gets no offsets
+            bounds = np.searchsorted(sorted_codes, np.arange(len(uniques) + 1), side="left")
+            for i, value in enumerate(uniques):
+                self._entity_offsets[value] = (int(bounds[i]), int(bounds[i + 1]))
+                self._entity_lookup[str(value)] = value
+            # Rows are entity-major, so a cross-entity time range needs a time order
+            self._time_order = np.argsort(self._ts, kind="stable")
+            self._ts_by_time = self._ts[self._time_order]
+
+        self._block_starts = np.arange(0, len(df), block_size)
+        self._zone_maps: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if len(df):
+            for col in df.select_dtypes(include=[np.number]).columns:
+                values = df[col].to_numpy(dtype="float64", na_value=np.nan)
+                self._zone_maps[col] = (
+                    np.fmin.reduceat(values, self._block_starts),
+                    np.fmax.reduceat(values, self._block_starts),
+                )
+
+    def __len__(self) -> int:
+        return len(self._ts)
+
+    @property
+    def entities(self) -> list:
+        return list(self._entity_offsets)
+
+    def _bounds(self, ts: np.ndarray, start, end, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        # Binary search for start <= t < end within ts[lo:hi]
+        hi = len(ts) if hi is None else hi
+        if start is not None:
+            lo = int(np.searchsorted(ts[lo:hi], _to_int(start, self.tz, self.unit), side="left")) + lo
+        if end is not None:
+            hi = int(np.searchsorted(ts[lo:hi], _to_int(end, self.tz, self.unit), side="left")) + lo
+        return lo, max(lo, hi)
+
+    def positions(self, start=None, end=None, entity=None) -> Positions:
+        """
+        Row positions in `df` with start <= timestamp < end (and the given
+        entity). A `slice` when the rows are contiguous, otherwise an array
+        ordered by time.
+        """
+        if entity is not None:
+            if self.entity_col is None:
+                raise ValueError("This index has no entity column")
+            key = entity if entity in self._entity_offsets else self._entity_lookup.get(str(entity))
+            if key is None:
+                return slice(0, 0)
+            lo, hi = self._entity_offsets[key]
+            return slice(*self._bounds(self._ts, start, end, lo, hi))
+
+        if self.entity_col is None:
+            return slice(*self._bounds(self._ts, start, end))
+        if start is None and end is None:
+            return self._time_order
+        lo, hi = self._bounds(self._ts_by_time, start, end)
+        return self._time_order[lo:hi]
+
+    def slice(self, start=None, end=None, entity=None) -> pd.DataFrame:
+        """
+        Rows of `df` in [start, end) for `entity`; a view when contiguous.
+        """
+        return self.df.iloc[self.positions(start, end, entity)]
+
+    def in_time_order(self, n: Optional[int] = None) -> pd.DataFrame:
+        """
+        The first `n` rows (all by default) of `df` in time order, whatever
+        the physical layout.
+        """
+        if self.entity_col is None:
+            return self.df if n is None else self.df.iloc[:n]
+        order = self._time_order if n is None else self._time_order[:n]
+        return self.df.iloc[order]
+
+    def candidate_blocks(self, col: str, op: str, value: float) -> Optional[np.ndarray]:
+        """
+        Boolean mask of blocks whose min/max could satisfy `col <op> value`,
+        or None if `col` has no zone map or `op` can't be pruned.
+        """
+        if col not in self._zone_maps:
+            return None
+        mins, maxs = self._zone_maps[col]
+        with np.errstate(invalid="ignore"):
+            if op == "gt":
+                return maxs > value
+            if op == "ge":
+                return maxs >= value
+            if op == "lt":
+                return mins < value
+            if op == "le":
+                return mins <= value
+            if op == "eq":
+                return (mins <= value) & (maxs >= value)
+        # "ne" is never pruned: NaN rows satisfy it whatever the block's min/max
+        return None
+
+    def prune(self, positions: Positions, col: str, op: str, value: float) -> Positions:
+        """
+        Drop positions lying in blocks that cannot satisfy `col <op> value`.
+        A slice stays a slice when no block in it can be skipped.
+        """
+        candidates = self.candidate_blocks(col, op, value)
+        if candidates is None:
+            return positions
+        if isinstance(positions, slice):
+            lo, hi = positions.start, positions.stop
+            if lo >= hi:
+                return positions
+            first, last = lo // self.block_size, (hi - 1) // self.block_size
+            blocks = first + np.flatnonzero(candidates[first:last + 1])
+            if len(blocks) == last - first + 1:
+                return positions
+            starts = np.maximum(blocks * self.block_size, lo)
+            stops = np.minimum((blocks + 1) * self.block_size, hi)
+            return np.concatenate(
+                [np.arange(a, b) for a, b in zip(starts, stops)] or [np.empty(0, dtype=np.int64)]
+            )
+        if candidates.all():
+            return positions
+        return positions[candidates[positions // self.block_size]]
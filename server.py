@@ -3,10 +3,11 @@ import uuid
 import tempfile
 import traceback
 import urllib.parse
+from typing import List, Optional
 
 import pandas as pd
-from fastapi import FastAPI, File, Form, Request, UploadFile
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
+from fastapi import FastAPI, File, Form, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -17,6 +18,25 @@ from flowmatic.quality_check import quality_report, detect_outliers_zscore
 from flowmatic.cleaning import clean
 from flowmatic.hf_push import push_df_to_hf
 from flowmatic.db_upload import build_postgres_url, upload_df_to_postgres
+from flowmatic.resample import RollupPyramid, resample
+from flowmatic.time_index import TimeIndex
+from flowmatic.query import (
+    DEFAULT_PAGE_SIZE,
+    decode_cursor,
+    dumps,
+    encode_cursor,
+    query_results,
+    SortCache,
+    time_positions,
+    to_arrow,
+    to_columnar,
+)
+from flowmatic.explain import (
+    AnomalyExplainer,
+    ExplanationCache,
+    summarize_by_column,
+    summarize_by_window,
+)
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -25,6 +45,14 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # In‐memory storage for cleaned DataFrames & quality reports
 CLEANED_DATA = {}
 QUALITY_REPORTS = {}
+# Precomputed 1min/15min/1h/1D rollups of each cleaned DataFrame
+ROLLUPS = {}
+# Time (and optional entity) index over each stored cleaned DataFrame
+INDEXES = {}
+# Per-column sort permutations of each stored DataFrame, filled on first use
+SORT_CACHES = {}
+# Column identifying a sensor/entity, e.g. "sensor_id"; rows are grouped by it
+ENTITY_COLUMN = os.environ.get("FLOWMATIC_ENTITY_COLUMN") or None
 
 try:
     openai_key = os.environ.get("OPENAI_API_KEY") or ""
@@ -32,6 +60,40 @@ try:
 except Exception:
     openai_key = ""
 
+# A custom base URL (e.g. a local stub server) enables explanations without a key
+openai_base_url = os.environ.get("OPENAI_BASE_URL") or None
+explain_available = bool(openai_key or openai_base_url)
+
+# Shared across requests so repeat questions hit the cache / coalesce in flight
+EXPLAINER = AnomalyExplainer(
+    api_key=openai_key or None,
+    model=os.environ.get("OPENAI_MODEL", "gpt-4o-mini"),
+    base_url=openai_base_url,
+    max_concurrency=int(os.environ.get("FLOWMATIC_EXPLAIN_CONCURRENCY", "4")),
+    cache=ExplanationCache(cache_dir=os.environ.get("FLOWMATIC_EXPLAIN_CACHE_DIR") or None),
+)
+
+def stored_frame(data_id: str, n: Optional[int] = None) -> pd.DataFrame:
+    # Stored rows in time order, even when the index keeps them grouped by entity
+    if data_id in INDEXES:
+        return INDEXES[data_id].in_time_order(n)
+    df = CLEANED_DATA[data_id]
+    return df if n is None else df.head(n)
+
+def select_range(data_id: str, start: Optional[str], end: Optional[str], entity: Optional[str]) -> pd.DataFrame:
+    # Rows in [start, end) (for `entity`), located via the index when there is one
+    if data_id in INDEXES:
+        return INDEXES[data_id].slice(start, end, entity)
+    if entity is not None:
+        raise ValueError("entity lookups require FLOWMATIC_ENTITY_COLUMN")
+    df = CLEANED_DATA[data_id]
+    return df.iloc[time_positions(df.index, start, end)]
+
+def get_rollup(data_id: str, resolution: str) -> pd.DataFrame:
+    if data_id not in ROLLUPS:
+        raise ValueError("rollups are not available for this dataset")
+    return ROLLUPS[data_id].get(resolution)
+
 @app.get("/", response_class=HTMLResponse)
 async def get_index(request: Request):
     return templates.TemplateResponse(
@@ -100,6 +162,7 @@ async def post_process(
         missing_dict = qr["missing"].to_dict()            # { column_name: missing_count, … }
         duplicates_count = qr["duplicates"]                # int
         outlier_count = len(qr["outliers"])                # int
+        outliers_df = qr["outliers"]                       # kept for /explain
     except Exception:
         tb = traceback.format_exc()
         return HTMLResponse(content=f"<pre>Error during quality check:\n{tb}</pre>", status_code=500)
@@ -110,6 +173,7 @@ async def post_process(
         "missing": missing_dict,
         "duplicates": duplicates_count,
         "outliers": outlier_count,
+        "outliers_df": outliers_df,
     }
 
     # ─── Cleaning ───────────────────────────────────────────────────────
@@ -119,7 +183,24 @@ async def post_process(
         tb = traceback.format_exc()
         return HTMLResponse(content=f"<pre>Error during cleaning:\n{tb}</pre>", status_code=500)
 
+    # The index only speeds up range lookups; the upload succeeds without it
+    try:
+        entity_col = ENTITY_COLUMN if ENTITY_COLUMN in df_clean.columns else None
+        index = TimeIndex(df_clean, entity_col=entity_col)
+        INDEXES[data_id] = index
+        # Store the index's (time- or entity-ordered) frame so lookups are slices
+        df_clean = index.df
+    except Exception:
+        traceback.print_exc()
+
     CLEANED_DATA[data_id] = df_clean
+    SORT_CACHES[data_id] = SortCache(df_clean)
+
+    # Rollups only serve ?resolution= requests; the upload succeeds without them
+    try:
+        ROLLUPS[data_id] = RollupPyramid(df_clean)
+    except Exception:
+        traceback.print_exc()
     # Redirect to results
     return RedirectResponse(url=f"/results/{data_id}", status_code=302)
 
@@ -128,7 +209,7 @@ async def get_results(request: Request, data_id: str):
     if data_id not in CLEANED_DATA or data_id not in QUALITY_REPORTS:
         return HTMLResponse(content="<h3>Data not found.</h3>", status_code=404)
 
-    df_clean = CLEANED_DATA[data_id]
+    df_head = stored_frame(data_id, 50)
     qr_metrics = QUALITY_REPORTS[data_id]
     missing_dict   = qr_metrics["missing"]      # {col: count, …}
     duplicates_cnt = qr_metrics["duplicates"]   # int
@@ -141,8 +222,8 @@ async def get_results(request: Request, data_id: str):
             "openai_available": bool(openai_key),
             "initial": False,
             "data_id": data_id,
-            "cleaned_head": df_clean.head(50).to_dict(orient="records"),
-            "columns": list(df_clean.columns),
+            "cleaned_head": df_head.to_dict(orient="records"),
+            "columns": list(df_head.columns),
             # Pass the QA metrics into the template:
             "missing_dict": missing_dict,
             "duplicates_cnt": duplicates_cnt,
@@ -151,11 +232,32 @@ async def get_results(request: Request, data_id: str):
     )
 
 @app.get("/download/{data_id}")
-async def download_file(data_id: str, fmt: str = "csv"):
+async def download_file(
+    data_id: str,
+    fmt: str = "csv",
+    resolution: str = "",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    entity: Optional[str] = None,
+):
     if data_id not in CLEANED_DATA:
         return HTMLResponse(content="<h3>Data not found.</h3>", status_code=404)
 
-    df_clean = CLEANED_DATA[data_id]
+    start, end, entity = start or None, end or None, entity or None
+    try:
+        if resolution and entity is None:
+            # Served from the cached rollup pyramid, not by rescanning raw rows
+            level = get_rollup(data_id, resolution)
+            df_clean = level.iloc[time_positions(level.index, start, end)]
+        elif resolution:
+            # No per-entity rollups: aggregate just this entity's rows
+            df_clean = resample(select_range(data_id, start, end, entity), resolution)
+        elif start or end or entity:
+            df_clean = select_range(data_id, start, end, entity)
+        else:
+            df_clean = stored_frame(data_id)
+    except ValueError as e:
+        return HTMLResponse(content=f"<h3>Invalid request: {e}</h3>", status_code=400)
     suffix = ".csv" if fmt == "csv" else ".json"
     tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
     tmp_path = tmp.name
@@ -164,9 +266,81 @@ async def download_file(data_id: str, fmt: str = "csv"):
     else:
         df_clean.to_json(tmp_path, date_format="iso", orient="records")
     tmp.close()
-    filename = f"flowmatic_cleaned_{data_id}{suffix}"
+    res_tag = f"_{resolution}" if resolution else ""
+    filename = f"flowmatic_cleaned_{data_id}{res_tag}{suffix}"
     return FileResponse(path=tmp_path, filename=filename, media_type="text/csv" if fmt == "csv" else "application/json")
 
+# Plain def: FastAPI runs it in its threadpool, so a first sort of a large
+# frame (or an ad-hoc rollup) doesn't block the event loop
+@app.get("/api/results/{data_id}")
+def get_results_api(
+    data_id: str,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = "",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    columns: str = "",
+    sort: str = "",
+    filter: List[str] = Query([]),
+    entity: Optional[str] = None,
+    resolution: str = "",
+    fmt: str = "json",
+):
+    if data_id not in CLEANED_DATA:
+        return JSONResponse(content={"error": "Data not found."}, status_code=404)
+
+    df = CLEANED_DATA[data_id]
+    index = INDEXES.get(data_id)
+    sorter = SORT_CACHES.get(data_id)
+    try:
+        if resolution:
+            if entity:
+                raise ValueError("entity cannot be combined with resolution")
+            df = get_rollup(data_id, resolution)
+            index = sorter = None
+        if cursor:
+            offset = decode_cursor(cursor)
+        page, total, next_offset = query_results(
+            df,
+            offset=offset,
+            limit=limit,
+            start=start,
+            end=end,
+            columns=[c for c in columns.split(",") if c] or None,
+            sort=sort or None,
+            filters=filter,
+            entity=entity or None,
+            index=index,
+            sorter=sorter,
+        )
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    next_cursor = encode_cursor(next_offset) if next_offset is not None else None
+    if fmt == "arrow":
+        try:
+            body = to_arrow(page)
+        except ValueError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=501)
+        headers = {"X-Total-Count": str(total)}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return Response(
+            content=body, media_type="application/vnd.apache.arrow.stream", headers=headers
+        )
+
+    payload = {
+        "data_id": data_id,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "columns": [str(c) for c in page.columns],
+        **to_columnar(page),
+    }
+    return Response(content=dumps(payload), media_type="application/json")
+
 @app.post("/push_hf")
 async def post_push_hf(
     request: Request,
@@ -177,7 +351,7 @@ async def post_push_hf(
     if data_id not in CLEANED_DATA:
         return HTMLResponse(content="<h3>Data not found.</h3>", status_code=404)
 
-    df_clean = CLEANED_DATA[data_id]
+    df_clean = stored_frame(data_id)
     try:
         push_df_to_hf(
             df=df_clean,
@@ -205,12 +379,19 @@ async def post_upload_db(
     pg_user: str = Form("postgres"),
     pg_pass: str = Form(""),
     pg_table: str = Form("test"),
+    start: str = Form(""),
+    end: str = Form(""),
+    entity: str = Form(""),
 ):
     if data_id not in CLEANED_DATA:
         return HTMLResponse(content="<h3>Data not found.</h3>", status_code=404)
 
-    df_clean = CLEANED_DATA[data_id]
     try:
+        if start or end or entity:
+            # Push only the requested range, located via the index
+            df_clean = select_range(data_id, start or None, end or None, entity or None)
+        else:
+            df_clean = stored_frame(data_id)
         db_url = build_postgres_url(
             username=pg_user or "postgres",
             password=pg_pass or "",
@@ -232,6 +413,38 @@ async def post_upload_db(
         params = urllib.parse.urlencode({"db_status": "error", "db_msg": msg})
         return RedirectResponse(url=f"/results/{data_id}?{params}", status_code=302)
 
+@app.post("/explain/{data_id}")
+async def post_explain(data_id: str, by: str = Form("column"), freq: str = Form("1h")):
+    if data_id not in QUALITY_REPORTS:
+        return JSONResponse(content={"error": "Data not found."}, status_code=404)
+    if not explain_available:
+        return JSONResponse(
+            content={"error": "Neither OPENAI_API_KEY nor OPENAI_BASE_URL is configured."},
+            status_code=503,
+        )
+
+    outliers = QUALITY_REPORTS[data_id]["outliers_df"]
+    if outliers.empty:
+        return JSONResponse(content={"explanations": {}})
+
+    try:
+        if by == "column":
+            summaries = summarize_by_column(outliers)
+        elif by == "window":
+            summaries = summarize_by_window(outliers, freq=freq)
+        elif by == "all":
+            summaries = {"anomalies": outliers.describe().to_dict()}
+        else:
+            raise ValueError("by must be 'column', 'window' or 'all'")
+    except (TypeError, ValueError) as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    try:
+        explanations = await EXPLAINER.explain_batch(summaries)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=502)
+    return JSONResponse(content={"explanations": explanations})
+
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from flowmatic.explain import AnomalyExplainer, ExplanationCache
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI-compatible chat completions endpoint. Batched (JSON mode)
+    prompts get one answer per "- label:" line; others get "single".
+    """
+
+    calls = []
+    delay = 0.2
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.calls.append(body)
+        time.sleep(self.delay)
+        prompt = body["messages"][-1]["content"]
+        if "response_format" in body:
+            labels = [line[2:].split(":")[0] for line in prompt.splitlines() if line.startswith("- ")]
+            content = json.dumps({label: f"because {label}" for label in labels})
+        else:
+            content = "single"
+        out = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubOpenAI.calls = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+
+
+def make_explainer(url, **kwargs):
+    # No API key: a base_url alone is enough for a local stub
+    return AnomalyExplainer(base_url=url, **kwargs)
+
+
+def test_repeat_questions_are_cached_on_disk(stub_url, tmp_path):
+    explainer = make_explainer(stub_url, cache=ExplanationCache(cache_dir=str(tmp_path)))
+    assert asyncio.run(explainer.explain({"a": 1})) == "single"
+    assert asyncio.run(explainer.explain({"a": 1})) == "single"
+    assert len(StubOpenAI.calls) == 1
+
+    # A fresh process (new in-memory cache) still reads the answer from disk
+    fresh = make_explainer(stub_url, cache=ExplanationCache(cache_dir=str(tmp_path)))
+    assert asyncio.run(fresh.explain({"a": 1})) == "single"
+    assert len(StubOpenAI.calls) == 1
+
+
+def test_in_flight_questions_are_coalesced(stub_url):
+    explainer = make_explainer(stub_url)
+
+    async def run():
+        return await asyncio.gather(
+            explainer.explain({"a": 1}),
+            explainer.explain({"a": 1}),
+            explainer.explain_batch({"x": {"a": 1}, "y": {"a": 2}}),
+            explainer.explain_batch({"x": {"a": 1}, "y": {"a": 2}}),
+        )
+
+    single, again, batch, batch_again = asyncio.run(run())
+    assert single == again == "single"
+    assert batch == batch_again == {"x": "because x", "y": "because y"}
+    assert len(StubOpenAI.calls) == 2
+
+
+def test_same_stats_under_other_labels_are_asked_separately(stub_url):
+    explainer = make_explainer(stub_url)
+    asyncio.run(explainer.explain_batch({"Speed_kmh": {"mean": 1}}))
+    asyncio.run(explainer.explain_batch({"Passenger_Count": {"mean": 1}}))
+    asyncio.run(explainer.explain({"mean": 1}))
+    prompts = [call["messages"][-1]["content"] for call in StubOpenAI.calls]
+    assert len(prompts) == 3
+    assert "for Speed_kmh" in prompts[0]
+    assert "for Passenger_Count" in prompts[1]
+    assert "Speed_kmh" not in prompts[2] and "Passenger_Count" not in prompts[2]
+
+
+def test_batches_are_chunked_with_scaled_token_budget(stub_url):
+    explainer = make_explainer(stub_url, max_batch_size=3, max_tokens=100)
+    summaries = {f"col{i}": {"mean": i} for i in range(7)}
+    answers = asyncio.run(explainer.explain_batch(summaries))
+    # 3 + 3 batched labels, then the last one asked on its own, still labelled
+    assert answers == {**{f"col{i}": f"because col{i}" for i in range(6)}, "col6": "single"}
+    assert sorted(call["max_tokens"] for call in StubOpenAI.calls) == [100, 300, 300]
+    single, = [call for call in StubOpenAI.calls if call["max_tokens"] == 100]
+    assert "for col6" in single["messages"][-1]["content"]
+
+
+def test_cancelled_caller_does_not_fail_coalesced_waiters(stub_url):
+    explainer = make_explainer(stub_url)
+
+    async def run():
+        first = asyncio.ensure_future(explainer.explain({"a": 1}))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(explainer.explain({"a": 1}))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "single"
+    assert len(StubOpenAI.calls) == 1
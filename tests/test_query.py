@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from flowmatic import query
+from flowmatic.query import SortCache, _argsort, dumps, query_results, time_positions, to_columnar
+
+
+@pytest.fixture
+def results():
+    rng = np.random.default_rng(1)
+    n = 5_000
+    index = pd.date_range("2024-01-01", periods=n, freq="1s")
+    df = pd.DataFrame(
+        {
+            "speed": rng.normal(50, 10, n).round(1),
+            "lane": rng.integers(0, 4, n),
+            "vehicle": rng.choice(["car", "bus"], n),
+        },
+        index=index,
+    )
+    df.iloc[::50, 0] = np.nan
+    return df
+
+
+def reference(df, start, end, filters, key, descending):
+    sub = df[(df.index >= start) & (df.index < end)]
+    for col, value in filters:
+        sub = sub[sub[col] > value]
+    return sub.sort_values(key, ascending=not descending, kind="stable", na_position="last")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_sorted_pages_match_pandas(results, monkeypatch, descending, use_cache):
+    if use_cache:
+        # Force the cached-permutation path on a small frame
+        monkeypatch.setattr(query, "DIRECT_SORT_MAX_ROWS", 0)
+    start, end = "2024-01-01 00:10", "2024-01-01 01:00"
+    expected = reference(results, start, end, [("lane", 0)], "speed", descending)
+    page, total, next_offset = query_results(
+        results,
+        offset=20,
+        limit=100,
+        start=start,
+        end=end,
+        sort=("-" if descending else "") + "speed",
+        filters=["lane:gt:0"],
+        sorter=SortCache(results) if use_cache else None,
+    )
+    assert total == len(expected)
+    assert next_offset == 120
+    pd.testing.assert_frame_equal(page, expected.iloc[20:120])
+
+
+def test_sort_cache_is_bounded_and_derives_descending_orders(results):
+    sorter = SortCache(results, maxsize=2)
+    for key in ["speed", "lane", "vehicle", "index"]:
+        for descending in (False, True):
+            values = results.index.to_numpy() if key == "index" else results[key].to_numpy()
+            np.testing.assert_array_equal(sorter.order(key, descending), _argsort(values, descending))
+    # Only ascending permutations are kept, and only the two most recent
+    assert list(sorter._orders) == ["vehicle", "index"]
+
+
+def test_naive_bounds_on_tz_aware_index(results):
+    aware = results.tz_localize("Europe/Berlin")
+    expected = aware[(aware.index >= "2024-01-01 00:10+01:00") & (aware.index < "2024-01-01 00:20+01:00")]
+    positions = time_positions(aware.index, "2024-01-01 00:10", "2024-01-01 00:20")
+    assert positions == slice(600, 1200)
+    shuffled = aware.iloc[::-1]
+    page, total, _ = query_results(shuffled, start="2024-01-01 00:10", end="2024-01-01 00:20")
+    assert total == len(expected)
+    assert page.index.sort_values().equals(expected.index)
+    # And an aware bound against a naive index
+    assert time_positions(results.index, "2024-01-01T00:10:00+00:00", None) == slice(600, len(results))
+
+
+def test_range_filters_skip_missing_strings(results):
+    results["vehicle"] = results["vehicle"].where(results["lane"] != 0)
+    page, total, _ = query_results(results, filters=["vehicle:gt:bus"], limit=query.MAX_PAGE_SIZE)
+    assert total == int((results["vehicle"] == "car").sum())
+    assert (page["vehicle"] == "car").all()
+
+
+def test_unfiltered_unsorted_page_is_a_slice(results):
+    page, total, next_offset = query_results(results, offset=4990, limit=100, columns=["speed"])
+    assert total == len(results)
+    assert next_offset is None
+    assert page.index.equals(results.index[4990:])
+    assert np.shares_memory(page["speed"].to_numpy(), results["speed"].to_numpy())
+
+
+def test_dumps_encodes_nan_as_null_with_and_without_orjson(results, monkeypatch):
+    page, _, _ = query_results(results, limit=3, columns=["speed", "lane", "vehicle"])
+    fast = json.loads(dumps(to_columnar(page)))
+    monkeypatch.setattr(query, "orjson", None)
+    slow = json.loads(dumps(to_columnar(page)))
+    assert fast == slow
+    assert fast["data"]["speed"][0] is None
+    assert fast["index"][0] == "2024-01-01T00:00:00"
+
+
+def test_dumps_encodes_timedeltas_as_iso_durations(results, monkeypatch):
+    page, _, _ = query_results(results, limit=2, columns=["speed"])
+    page = page.assign(gap=pd.to_timedelta([90, None], unit="s"))
+    fast = json.loads(dumps(to_columnar(page)))
+    monkeypatch.setattr(query, "orjson", None)
+    assert json.loads(dumps(to_columnar(page))) == fast
+    assert fast["data"]["gap"] == ["P0DT0H1M30S", None]
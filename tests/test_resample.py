@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flowmatic.resample import RollupPyramid, resample
+
+
+@pytest.fixture
+def events():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    offsets = np.sort(rng.integers(0, 3 * 86400 * 1000, n))
+    index = pd.Timestamp("2024-01-01") + pd.to_timedelta(offsets, unit="ms")
+    df = pd.DataFrame(
+        {
+            "speed": rng.normal(50, 10, n),
+            "vehicle": rng.choice(["car", "bus", "truck"], n),
+        },
+        index=index,
+    )
+    df.iloc[::97, 0] = np.nan
+    return df
+
+
+def test_resample_matches_pandas(events):
+    out = resample(events, "15min")
+    expected = events["speed"].resample("15min").agg(["count", "min", "max", "mean"])
+    expected = expected[expected["count"] > 0]
+    np.testing.assert_array_equal(out["speed_count"].to_numpy(), expected["count"].to_numpy())
+    np.testing.assert_allclose(out["speed_mean"].to_numpy(), expected["mean"].to_numpy())
+    assert set(out["vehicle_mode"]) <= {"car", "bus", "truck"}
+
+
+@pytest.mark.parametrize("freq", ["15min", "1h", "1D", "2h"])
+def test_pyramid_levels_match_direct_resample(events, freq):
+    rolled = RollupPyramid(events).get(freq)
+    direct = resample(events, freq)
+    pd.testing.assert_frame_equal(
+        rolled.drop(columns="speed_mean"), direct.drop(columns="speed_mean"), check_freq=False
+    )
+    np.testing.assert_allclose(rolled["speed_mean"], direct["speed_mean"])
+
+
+def test_sparse_buckets_follow_row_count_not_time_span():
+    index = pd.to_datetime(["2001-01-01 00:00:00", "2001-01-01 00:00:30", "2006-01-01 00:00:00"])
+    df = pd.DataFrame({"v": [1.0, 2.0, 3.0]}, index=index)
+    pyramid = RollupPyramid(df)
+    assert len(pyramid.get("1min")) == 2
+    assert pyramid.get("1min")["v_count"].tolist() == [2, 1]
+
+
+@pytest.mark.parametrize("freq", ["0min", "-1min", "abc", "30s", "7s"])
+def test_invalid_resolutions_raise_value_error(events, freq):
+    with pytest.raises(ValueError):
+        RollupPyramid(events).get(freq)
+
+
+def test_ad_hoc_resolutions_are_not_kept(events):
+    pyramid = RollupPyramid(events)
+    assert len(pyramid.get("2h")) > 0
+    assert len(pyramid.get("120min")) == len(pyramid.get("2h"))
+    assert pyramid.levels == ["1min", "15min", "1h", "1D"]
+    assert len(pyramid._levels) == 4
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flowmatic.query import query_results
+from flowmatic.time_index import TimeIndex
+
+
+@pytest.fixture
+def readings():
+    rng = np.random.default_rng(2)
+    n = 10_000
+    index = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 86400, n), unit="s")
+    return pd.DataFrame(
+        {
+            "sensor": rng.choice(["a", "b", "c"], n),
+            "v": rng.integers(0, 10, n).astype(float),
+        },
+        index=index,
+    )
+
+
+def test_entity_range_is_a_view_matching_a_mask(readings):
+    index = TimeIndex(readings, entity_col="sensor", block_size=512)
+    start, end = "2024-01-01 10:00", "2024-01-01 10:15"
+    got = index.slice(start, end, "b")
+    mask = (readings["sensor"] == "b") & (readings.index >= start) & (readings.index < end)
+    expected = readings[mask].sort_index(kind="stable")
+    assert got.index.equals(expected.index)
+    assert np.shares_memory(got["v"].to_numpy(), index.df["v"].to_numpy())
+
+
+def test_in_time_order_undoes_entity_grouping(readings):
+    index = TimeIndex(readings, entity_col="sensor")
+    ordered = index.in_time_order()
+    assert ordered.index.is_monotonic_increasing
+    assert len(ordered) == len(readings)
+    assert index.in_time_order(5).index.equals(ordered.index[:5])
+
+
+def test_index_outside_nanosecond_bounds():
+    df = pd.DataFrame(
+        {"v": [1.0, 2.0, 3.0]},
+        index=pd.DatetimeIndex(["1001-01-01", "1500-06-01", "2500-01-01"]).as_unit("s"),
+    )
+    index = TimeIndex(df)
+    assert index.slice("1400-01-01", "2400-01-01")["v"].tolist() == [2.0]
+    assert index.slice("1001-01-01 00:00:00.5")["v"].tolist() == [2.0, 3.0]
+
+
+def test_ne_filter_keeps_nan_rows_in_uniform_blocks():
+    v = np.full(256, 5.0)
+    v[::2] = np.nan
+    df = pd.DataFrame({"v": v}, index=pd.date_range("2024-01-01", periods=256, freq="1s"))
+    index = TimeIndex(df, block_size=16)
+    with_index = query_results(df, filters=["v:ne:5"], index=index)[1]
+    without = query_results(df, filters=["v:ne:5"])[1]
+    assert with_index == without == 128
+
+
+def test_zone_maps_prune_without_changing_results(readings):
+    # "secs" rises with time, so most blocks can be skipped for it
+    readings = readings.assign(secs=(readings.index - pd.Timestamp("2024-01-01")).total_seconds())
+    index = TimeIndex(readings, block_size=256)
+    candidates = index.candidate_blocks("secs", "gt", 80000)
+    assert candidates.sum() <= len(candidates) // 4
+    for spec in ["v:gt:8", "v:le:0", "secs:gt:80000", "secs:eq:43200", "secs:ne:0"]:
+        pruned = query_results(index.df, filters=[spec], start="2024-01-01 06:00", index=index)
+        plain = query_results(index.df, filters=[spec], start="2024-01-01 06:00")
+        assert pruned[1] == plain[1]
+        pd.testing.assert_frame_equal(pruned[0], plain[0])